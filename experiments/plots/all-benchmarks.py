@@ -1,6 +1,5 @@
-import collections
-import csv
-import os
+import analytics
+import numpy as np
 import re
 import subprocess
 import sys
@@ -22,17 +21,19 @@ def rename_benchmark(bm):
     else:
         return bm[1:-1]  # s-expr
 
-f = open("%s.out.csv" % sys.argv[1])
-rdr = csv.DictReader(f)
-f2 = open("%s.csv" % sys.argv[1], "w")
-f2.write("\"benchmark\",\"group\",\"time\",\"timeout\"\n")
+results = analytics.load_results(sys.argv[1])
 
-for row in rdr:
-    f2.write("%s,%s,%s,%s\n" % (rename_benchmark(row["benchmark"]), row["group"],
-                             row["time"], row["timeout"]))
+# rename each distinct benchmark once, rather than once per row
+names, index = analytics.group_index(results["benchmark"])
+renamed = [rename_benchmark(bm) for bm in names[0]]
+benchmarks = np.array(renamed, dtype=str)[index]
 
+f2 = open("%s.csv" % sys.argv[1], "w")
+analytics.write_csv(f2, ["benchmark", "group", "time", "timeout"],
+                    [benchmarks, results["group"], results["time"],
+                     results["timeout"]],
+                    ["%s", "%s", "%.3f", "%s"])
 f2.close()
-f.close()
 
 fR = tempfile.NamedTemporaryFile()
 fR.write('''
@@ -0,0 +1,240 @@
+import csv
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+# Shared loading and analysis of experiment results for the plot scripts.
+#
+# Results are loaded into columns: a dict from column name to a NumPy array,
+# with one element per row. Parsing happens once; the columns are cached next
+# to the data (in <file>.npz), and when the data file has only grown since (as
+# it does when run.py appends results), just the new lines are parsed and
+# appended to the cache.
+
+
+## incremental loading #########################################################
+
+# bump to invalidate every cache when the parsed representation changes
+CACHE_VERSION = 1
+
+
+# load the columns of a line-oriented data file through its cache. parse takes
+# a list of complete lines, and returns a dict of columns for them; with
+# header=True, the file's first line is a header and is not passed to parse.
+def load_cached(path, parse, header=False):
+    cache_path = path + ".npz"
+    with open(path, "rb") as f:
+        data = f.read()
+    start = data.find("\n") + 1 if header else 0
+
+    columns, offset = None, start
+    if os.path.exists(cache_path):
+        cache = np.load(cache_path)
+        offset = int(cache["__offset__"])
+        # the cache is still good if the file only grew since
+        if int(cache["__version__"]) == CACHE_VERSION and \
+           offset <= len(data) and \
+           str(cache["__digest__"]) == prefix_digest(data, offset):
+            columns = dict((k, cache[k]) for k in cache.files
+                                          if not k.startswith("__"))
+        else:
+            offset = start
+
+    # parse complete lines past the offset
+    end = data.rfind("\n") + 1
+    if columns is None or end > offset:
+        new = parse(data[offset:end].splitlines(True))
+        if columns is None:
+            columns = new
+        else:
+            columns = dict((k, np.concatenate([columns[k], new[k]]))
+                             for k in columns)
+        offset = max(offset, end)
+        np.savez(cache_path, __version__=CACHE_VERSION, __offset__=offset,
+                 __digest__=prefix_digest(data, offset), **columns)
+    return columns
+
+
+# a fingerprint of the first n bytes of a file's data (hashing is much cheaper
+# than parsing)
+def prefix_digest(data, n):
+    return hashlib.sha1(buffer(data, 0, n)).hexdigest()
+
+
+## run results #################################################################
+
+# load an experiment's results (<name>.out.csv): a column per identifier key,
+# plus "time" (float; NaN for jobs a policy skipped), "timeout" (bool), and
+# "decision" (str, for results from run.py's policies), and a "profile_<phase>"
+# (float; NaN unless the job was profiled) for each phase run.py records
+def load_results(name):
+    path = "%s.out.csv" % name
+    with open(path) as f:
+        header = next(csv.reader([f.readline()]))
+    return load_cached(path, lambda lines: parse_results(lines, header),
+                       header=True)
+
+
+def parse_results(lines, header):
+    rows = list(csv.reader(lines))
+    columns = {}
+    for i, k in enumerate(header):
+        col = [r[i] for r in rows]
+        if k == "time" or k.startswith("profile_"):
+            columns[k] = np.array([v or "nan" for v in col], dtype=float)
+        elif k == "timeout":
+            columns[k] = np.array([v == "True" for v in col], dtype=bool)
+        else:
+            columns[k] = np.array(col, dtype=str)
+    return columns
+
+
+# the rows of a set of columns for which mask is true
+def select(columns, mask):
+    return dict((k, v[mask]) for k, v in columns.items())
+
+
+# the benchmarks that timed out in any configuration
+def timeouts(results):
+    return np.unique(results["benchmark"][results["timeout"]])
+
+
+# number the distinct combinations of values in the given columns: returns
+# (keys, index), where keys[j] is the j'th combination (as a tuple of arrays)
+# and index[i] is the combination in row i
+def group_index(*cols):
+    code = np.zeros(len(cols[0]), dtype=np.int64)
+    uniques = []
+    for col in cols:
+        u, inv = np.unique(col, return_inverse=True)
+        code = code * len(u) + inv
+        uniques.append(u)
+    codes, index = np.unique(code, return_inverse=True)
+    keys = []
+    for u in reversed(uniques):
+        keys.append(u[codes % len(u)])
+        codes = codes // len(u)
+    return tuple(reversed(keys)), index
+
+
+# sum values over each distinct combination of the given columns
+def group_sums(values, *cols):
+    keys, index = group_index(*cols)
+    return keys, np.bincount(index, weights=values, minlength=len(keys[0]))
+
+
+# speedup of each configuration (the value of the `config` column) over the
+# baseline configuration, per benchmark group: the ratio of total solving times
+# over benchmarks that did not time out in any configuration. returns
+# (groups, configs, speedups) as parallel arrays.
+def speedups(results, config, baseline):
+    ok = select(results, ~np.in1d(results["benchmark"], timeouts(results)))
+    (groups, configs), sums = group_sums(ok["time"], ok["group"], ok[config])
+    base = dict((g, s) for g, c, s in zip(groups, configs, sums)
+                         if c == baseline)
+    norms = np.array([base.get(g, 0.0) for g in groups])
+    return groups, configs, norms / sums
+
+
+# write columns to a CSV file, with the given column names and value formats
+def write_csv(f, names, columns, formats):
+    f.write(",".join("\"%s\"" % n for n in names) + "\n")
+    fmt = ",".join(formats) + "\n"
+    for row in zip(*columns):
+        f.write(fmt % row)
+
+
+## search events ###############################################################
+
+# load the global search's events from an experiment (<name>.events.jsonl, or
+# for older experiments the human-readable <name>.out.txt): columns "t",
+# "event" (sketch-start, sketch-sat or sketch-finish), "cost" (for sketch-sat)
+# and "remaining" and "complete" (for sketch-start); missing values are NaN
+def load_events(name):
+    path = "%s.events.jsonl" % name
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        return load_cached(path, parse_events)
+    return load_cached("%s.out.txt" % name, parse_log)
+
+
+# columns for a list of (t, event, cost, remaining, complete) rows
+def event_columns(rows):
+    t, event, cost, remaining, complete = zip(*rows) if rows else ([],) * 5
+    return {"t": np.array(t, dtype=float),
+            "event": np.array(event, dtype=str),
+            "cost": np.array(cost, dtype=float),
+            "remaining": np.array(remaining, dtype=float),
+            "complete": np.array(complete, dtype=float)}
+
+
+def parse_events(lines):
+    nan = float("nan")
+    rows = []
+    for line in lines:
+        evt = json.loads(line)
+        # worker places' events have a worker id, and are not needed here
+        if evt["worker"] is not None:
+            continue
+        if evt["event"] == "sketch-sat":
+            rows.append((evt["t"], "sketch-sat", evt["cost"], nan, nan))
+        elif evt["event"] == "sketch-start":
+            remaining = evt["remaining"]
+            rows.append((evt["t"], "sketch-start", nan,
+                         float("inf") if remaining is None else remaining,
+                         evt["complete"]))
+        elif evt["event"] in ("sketch-unsat", "sketch-timeout"):
+            rows.append((evt["t"], "sketch-finish", nan, nan, nan))
+    return event_columns(rows)
+
+
+def parse_log(lines):
+    nan = float("nan")
+    rows = []
+    for line in lines:
+        m = re.search("\[t=([0-9\.]+)s\] SAT <.+> with cost ([0-9]+)", line)
+        if m:
+            rows.append((float(m.group(1)), "sketch-sat", int(m.group(2)),
+                         nan, nan))
+            continue
+        m = re.search("\[t=([0-9\.]+)s\] starting sketch .+ \[(.+) remaining; (\d+) complete; (\d+) samples\]", line)
+        if m:
+            remaining = m.group(2)
+            rows.append((float(m.group(1)), "sketch-start", nan,
+                         float("inf") if remaining == "+inf.0" else
+                           int(remaining),
+                         int(m.group(3))))
+            continue
+        m = re.search("\[t=([0-9\.]+)s\] (UNSAT|TIMEOUT)", line)
+        if m:
+            rows.append((float(m.group(1)), "sketch-finish", nan, nan, nan))
+    return event_columns(rows)
+
+
+# the progress of a search after each sketch finishes: returns (time,
+# remaining, complete, best cost) arrays, where remaining is NaN until the
+# number of sketches is known, and best cost is NaN until a solution is found
+def search_progress(events):
+    order = np.argsort(events["t"], kind="mergesort")
+    t = events["t"][order]
+    kind = events["event"][order]
+    sat = kind == "sketch-sat"
+    unsat = kind == "sketch-finish"
+
+    # sketches proved unsat (or timed out) so far
+    complete = np.cumsum(unsat)
+    # the lowest cost found so far
+    best = np.minimum.accumulate(np.where(sat, events["cost"][order], np.inf))
+    # the number of remaining sketches last reported, less those finished since
+    remaining = events["remaining"][order]
+    known = (kind == "sketch-start") & np.isfinite(remaining)
+    last = np.maximum.accumulate(np.where(known, np.arange(len(t)), -1))
+    since = complete - complete[np.maximum(last, 0)]
+    remaining = np.where(last >= 0, remaining[np.maximum(last, 0)] - since,
+                         np.nan)
+
+    finish = sat | unsat
+    best = np.where(np.isfinite(best), best, np.nan)
+    return t[finish], remaining[finish], complete[finish], best[finish]
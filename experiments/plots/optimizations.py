@@ -1,46 +1,17 @@
-import collections
-import csv
-import os
+import analytics
 import subprocess
 import sys
 import tempfile
 
-results = []
+results = analytics.load_results(sys.argv[1])
 
-f = open("%s.out.csv" % sys.argv[1])
-rdr = csv.DictReader(f)
-for row in rdr:
-    results.append({"benchmark": row["benchmark"],
-                    "group":     row["group"],
-                    "opts":      row["opts"],
-                    "time":      float(row["time"]),
-                    "timeout":   row["timeout"] == "True"})
-f.close()
+print set(analytics.timeouts(results))
 
-timeouts = set(r["benchmark"] for r in results if r["timeout"])
-print timeouts
-
-groups = set(r["group"] for r in results)
-norms = {grp: sum(r["time"] for r in results 
-                                if r["opts"] == "none" 
-                                    and r["group"] == grp 
-                                    and r["benchmark"] not in timeouts)
-              for grp in groups}
-
-groups = collections.defaultdict(lambda: collections.defaultdict(list))
-for r in results:
-    if r["benchmark"] not in timeouts:
-        groups[r["group"]][r["opts"]].append(r["time"])
-means = collections.defaultdict(dict)
-for g in groups:
-    for t in groups[g]:
-        means[g][t] = norms[g] / sum(groups[g][t])
+groups, opts, speedups = analytics.speedups(results, "opts", "none")
 
 f = open("%s.csv" % sys.argv[1], "w")
-f.write("\"group\",\"opts\",\"normtime\"\n")
-for g in means:
-    for o in means[g]:
-        f.write("%s,%s,%f\n" % (g, o, means[g][o]))
+analytics.write_csv(f, ["group", "opts", "normtime"],
+                    [groups, opts, speedups], ["%s", "%s", "%f"])
 f.close()
 
 fR = tempfile.NamedTemporaryFile()
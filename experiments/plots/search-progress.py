@@ -1,67 +1,20 @@
-import collections
-import csv
-import os
-import re
+import analytics
+import numpy as np
 import subprocess
 import sys
 import tempfile
 
-f = open("%s.out.txt" % sys.argv[1])
-
-# generate a list of events
-SAT = 0
-UNSAT = 1
-START = 2
-FINISH = 3
-events = []
-for line in f:
-    m = re.search("\[t=([0-9\.]+)s\] SAT <.+> with cost ([0-9]+)", line)
-    if m:
-        time = float(m.group(1))
-        cost = int(m.group(2))
-        events.append((time, FINISH, SAT, cost))
-        continue
-    m = re.search("\[t=([0-9\.]+)s\] starting sketch .+ \[(.+) remaining; (\d+) complete; (\d+) samples\]", line)
-    if m:
-        time = float(m.group(1))
-        remaining = m.group(2)
-        if remaining != "+inf.0":
-            remaining = int(remaining)
-        complete = int(m.group(3))
-        events.append((time, START, remaining, complete))
-        continue
-    m = re.search("\[t=([0-9\.]+)s\] (UNSAT|TIMEOUT)", line)
-    if m:
-        time = float(m.group(1))
-        events.append((time, FINISH, UNSAT))
-        continue
-f.close()
+events = analytics.load_events(sys.argv[1])
+time, remaining, complete, best_cost = analytics.search_progress(events)
 
-# sort events by time
-events = sorted(events, key=lambda e: e[0])
+# write CSV, leaving unknown values empty
+def column(values):
+    return np.where(np.isnan(values), "", values.astype(int).astype(str))
 
-# write CSV
 f = open("%s.csv" % sys.argv[1], "w")
-f.write("\"time\",\"remaining\",\"complete\",\"cost\"\n")
-
-remaining = ""
-complete = 0
-best_cost = ""
-for evt in events:
-    t = evt[0]
-    if evt[1] == START:
-        if evt[2] != "+inf.0":
-            remaining = evt[2]
-    elif evt[1] == FINISH:
-        if evt[2] == SAT:
-            if best_cost == "" or evt[3] < best_cost:
-                best_cost = evt[3]
-        elif evt[2] == UNSAT:
-            complete += 1
-            if remaining != "":
-                remaining -= 1
-        f.write("%f,%s,%s,%s\n" % (t, remaining, complete, best_cost))
-
+analytics.write_csv(f, ["time", "remaining", "complete", "cost"],
+                    [time, column(remaining), complete, column(best_cost)],
+                    ["%f", "%s", "%s", "%s"])
 f.close()
 
 fR = tempfile.NamedTemporaryFile()
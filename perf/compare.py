@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+import argparse
+import json
+import math
+import sys
+
+# Compares the results of two runs of perf/engine.rkt, benchmark by benchmark.
+#
+# A benchmark regresses when its new times are significantly slower than the
+# baseline's (by a two-sided Mann-Whitney U test, which makes no assumption
+# about how the times are distributed) and its median slowed down by more than
+# the threshold; the exit status is 1 if any benchmark regressed.
+
+
+## statistics ##################################################################
+
+def median(xs):
+    xs = sorted(xs)
+    n = len(xs)
+    if n == 0:
+        return float("nan")
+    if n % 2 == 1:
+        return xs[n // 2]
+    return (xs[n // 2 - 1] + xs[n // 2]) / 2.0
+
+
+# the two-sided p-value of a Mann-Whitney U test that xs and ys come from the
+# same distribution, using the normal approximation with a tie correction
+def mann_whitney(xs, ys):
+    n1, n2 = len(xs), len(ys)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+    values = sorted([(v, 0) for v in xs] + [(v, 1) for v in ys])
+    n = n1 + n2
+    # rank the pooled values, giving ties their average rank
+    r1 = 0.0
+    ties = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j < n and values[j][0] == values[i][0]:
+            j += 1
+        rank = (i + j + 1) / 2.0
+        r1 += rank * sum(1 for k in xrange(i, j) if values[k][1] == 0)
+        t = j - i
+        ties += t ** 3 - t
+        i = j
+    u = r1 - n1 * (n1 + 1) / 2.0
+    mu = n1 * n2 / 2.0
+    var = n1 * n2 / 12.0 * ((n + 1) - ties / (n * (n - 1)))
+    if var <= 0:
+        return 1.0
+    z = (abs(u - mu) - 0.5) / math.sqrt(var)  # with continuity correction
+    return min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+
+
+## comparison ##################################################################
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)["benchmarks"]
+
+
+# returns a list of (name, old median, new median, ratio, p, verdict), where
+# verdict is "regression", "improvement", "" (no significant change) or
+# "missing" (in only one of the runs)
+def compare(old, new, alpha, threshold):
+    rows = []
+    for name in sorted(set(old) | set(new)):
+        if name not in old or name not in new:
+            rows.append((name, None, None, None, None, "missing"))
+            continue
+        xs, ys = old[name]["times"], new[name]["times"]
+        m0, m1 = median(xs), median(ys)
+        ratio = m1 / m0 if m0 > 0 else float("nan")
+        p = mann_whitney(xs, ys)
+        verdict = ""
+        if p < alpha and ratio > 1 + threshold:
+            verdict = "regression"
+        elif p < alpha and ratio < 1 / (1 + threshold):
+            verdict = "improvement"
+        rows.append((name, m0, m1, ratio, p, verdict))
+    return rows
+
+
+def print_rows(rows):
+    fmt = "%-28s %12s %12s %8s %8s  %s"
+    print fmt % ("benchmark", "old (ms)", "new (ms)", "ratio", "p", "")
+    for name, m0, m1, ratio, p, verdict in rows:
+        if verdict == "missing":
+            print fmt % (name, "-", "-", "-", "-", verdict)
+        else:
+            print fmt % (name, "%.3f" % m0, "%.3f" % m1, "%.3f" % ratio,
+                         "%.4f" % p, verdict)
+
+
+## main ########################################################################
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description='Compare engine benchmark results')
+    p.add_argument("baseline", help="results of the baseline run")
+    p.add_argument("new", help="results of the run to check")
+    p.add_argument("--alpha", type=float, default=0.01,
+                     help="significance level of the test (default 0.01)")
+    p.add_argument("--threshold", type=float, default=0.05,
+                     help="smallest relative change in the median to report "
+                          "(default 0.05)")
+    args = p.parse_args()
+
+    rows = compare(load(args.baseline), load(args.new), args.alpha,
+                   args.threshold)
+    print_rows(rows)
+
+    regressions = [r[0] for r in rows if r[5] == "regression"]
+    if regressions:
+        print
+        print "%d regression(s): %s" % (len(regressions), ", ".join(regressions))
+        sys.exit(1)
@@ -1,18 +1,32 @@
 #!/usr/bin/env python
 import argparse
+import base64
+import BaseHTTPServer
 import collections
 from cpuinfo import cpuinfo
+import csv
 import datetime
+import errno
+import fcntl
+import glob
 import hashlib
 import json
-import multiprocessing
 import os
 import psutil
+import Queue
+import re
+import select
+import shutil
 import signal
+import socket
+import SocketServer
+import sqlite3
 import subprocess32 as subprocess
 import sys
 import tempfile
+import threading
 import time
+import zlib
 
 
 # default arguments that experiments can override
@@ -43,8 +57,17 @@ BENCHMARK_TO_GROUP = {
 }
 
 
-# a job is a single execution of racket
-Job = collections.namedtuple("Job", ["id", "command", "threads", "timeout", "ident"])
+# a job is a single execution of racket. config numbers the experiment
+# configuration it came from, and policy holds its POLICY_ARGUMENTS.
+Job = collections.namedtuple("Job", ["id", "command", "threads", "timeout",
+                                     "ident", "config", "policy"])
+
+# arguments that set a job's early-termination policies (see SweepPolicy)
+# rather than racket's command line
+POLICY_ARGUMENTS = ["max_timeouts", "stable_cost", "priority"]
+
+# seconds a worker agent waits before asking an idle coordinator for work again
+WORKER_POLL_INTERVAL = 5
 
 ## experiment configuration parsing ############################################
 
@@ -74,7 +97,7 @@ def arguments_to_command_line(args):
     # canonicalize arguments by sorting keys
     for k in sorted(args):
         v = args[k]
-        if k == "timeout":
+        if k == "timeout" or k in POLICY_ARGUMENTS:
             pass  # used only by this running script, not racket
         elif k == "solver_timeout":
             cmd.extend(["-t", str(v)])
@@ -102,17 +125,31 @@ def arguments_to_command_line(args):
             cmd.extend(["-o", str(v)])
         elif k == "widening":
             if v: cmd.extend(["-w"])
+        elif k == "speculate":
+            if v: cmd.extend(["-W"])
         elif k == "solver":
             cmd.extend(["-r", str(v)])
+        elif k == "sample_limit":
+            cmd.extend(["-m", str(v)])
+        elif k == "prefilter":
+            cmd.extend(["-p", str(v)])
+        elif k == "partition":
+            cmd.extend(["-d", str(v)])
+        elif k == "slice":
+            cmd.extend(["-S", str(v)])
+        elif k == "verdicts":
+            cmd.extend(["-V", str(v)])
+        elif k == "profile":
+            if v: cmd.extend(["-T"])
         else:
             raise Exception("unrecognized argument '%s'" % k)
     return cmd
 
 
 # input: an id number, a dictionary of arguments, a benchmark name, 
-#        and an identifier dict
+#        an identifier dict, and a configuration number
 # output: an instance of Job
-def create_job(num, args, bm, ident):
+def create_job(num, args, bm, ident, config):
     assert "threads" in args
     assert "timeout" in args
     # where is benchmarks/run.rkt?
@@ -121,9 +158,14 @@ def create_job(num, args, bm, ident):
 
     cmd = ["racket", run_path] + arguments_to_command_line(args) + [bm]
     threads = args["threads"]
+    # speculative widening runs a second lane of solvers per worker, on cores
+    # beyond its threads that are in its affinity mask, so reserve them too
+    if args.get("speculate"):
+        threads *= 2
     timeout = args["timeout"]
+    policy = {k: args[k] for k in POLICY_ARGUMENTS if k in args}
 
-    return Job(num, cmd, threads, timeout, ident)
+    return Job(num, cmd, threads, timeout, ident, config, policy)
 
 
 # expand an experiment definition into a set of jobs
@@ -144,7 +186,7 @@ def generate_jobs(exp, only=None):
 
     # build up jobs
     jobs = []
-    for config in configs:
+    for i, config in enumerate(configs):
         args = default_args.copy()
         args.update(config.get("arguments", {}))
         benchmarks = default_benchmarks + config.get("benchmarks", [])
@@ -154,7 +196,7 @@ def generate_jobs(exp, only=None):
                 ident = config.get("id", {}).copy()
                 ident["group"] = grp
                 ident["benchmark"] = bm
-                job = create_job(len(jobs), args, bm, ident)
+                job = create_job(len(jobs), args, bm, ident, i)
                 jobs.append(job)
 
     return jobs
@@ -173,83 +215,518 @@ def compile_runner():
     subprocess.check_call(["raco", "make", run_path])
 
 
-# execute a single job and send it back on the queue
-def run_job(queue, job):
-    # multiprocessing: don't capture ctrl+c
-    signal.signal(signal.SIGINT, signal.SIG_IGN)
-
-    output_file = tempfile.NamedTemporaryFile(bufsize=8, delete=False)
-    output_file.write("experiment: %s\n" % " ".join(sys.argv))
-    output_file.write("start: %s\n" % datetime.datetime.now())
-    output_file.write("cpu: %s\n" % cpuinfo.get_cpu_info()['brand'])
-    if sys.platform.startswith("linux"):
-        output_file.write("affinity: %s\n" % psutil.Process().cpu_affinity())
-    output_file.write("\n")
-    output_file.write("cmd: %s\n" % " ".join(job.command))
-    output_file.write("\n")
-    output_file.flush()
-
-    queue.put(("start", job, output_file.name))
+# the cpu's brand name, for log headers
+def cpu_brand():
+    global CPU_BRAND
+    if CPU_BRAND is None:
+        CPU_BRAND = cpuinfo.get_cpu_info()['brand']
+    return CPU_BRAND
+CPU_BRAND = None
+
+
+# read a file in chunks, so that job logs never need to fit in memory
+def file_chunks(path, size=1 << 16):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(size), ""):
+            yield chunk
+
+
+# split chunks into complete lines (dropping any unterminated last line)
+def chunk_lines(chunks):
+    rest = ""
+    for chunk in chunks:
+        lines = (rest + chunk).split("\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line + "\n"
+
+
+# the file that run.rkt --events writes a job's structured search events to
+# (as JSON Lines), next to the job's log
+def events_path(log):
+    return os.path.splitext(log)[0] + ".events.jsonl"
+
+
+# a job's events, in chunks (none if it never wrote any)
+def events_chunks(log):
+    path = events_path(log)
+    return file_chunks(path) if os.path.exists(path) else []
+
+
+# delete a job's log and events files
+def remove_log(log):
+    for path in (log, events_path(log)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# Runs jobs as direct children of this process. Each job gets its own process
+# group, so that a timeout kills racket together with its places' solver
+# processes, and writes its output straight to a log file on disk. Waiting is
+# event-driven: SIGCHLD (or a warm server's reply) wakes up a select() whose
+# timeout is the nearest job deadline.
+#
+# With warm=True, jobs run on a pool of `run.rkt --server` processes instead of
+# a fresh racket each, so only the first job on each server pays for starting
+# Racket and loading Rosette and the benchmarks. A server that is killed for a
+# timeout is discarded, and replaced by a fresh one when next needed.
+class JobRunner(object):
+    def __init__(self, warm=False):
+        self.warm = warm
+        self.idle = []     # warm servers waiting for a job
+        self.running = {}  # job id -> (job, process, log path, start time)
+        self.wakeup, w = os.pipe()
+        for fd in (self.wakeup, w):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        signal.set_wakeup_fd(w)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        signal.siginterrupt(signal.SIGCHLD, False)
+        # turn SIGTERM into an exception, so callers' cleanup kills our jobs
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+
+    # start a job pinned to the given cpus, saving its progress to the given
+    # checkpoint file (if any), and return the path of its log
+    def start(self, job, cpus, checkpoint=None):
+        log = tempfile.NamedTemporaryFile(prefix="synapse-", suffix=".log",
+                                          delete=False)
+        log.write("experiment: %s\n" % " ".join(sys.argv))
+        log.write("start: %s\n" % datetime.datetime.now())
+        log.write("cpu: %s\n" % cpu_brand())
+        if sys.platform.startswith("linux"):
+            log.write("affinity: %s\n" % cpus)
+        log.write("\n")
+        log.write("cmd: %s\n" % " ".join(job.command))
+        log.write("\n")
+        log.flush()
+
+        # events and checkpoints are outputs, like the log, so they are not part
+        # of the job's command (and cache key)
+        command = job.command[:2] + ["--events", events_path(log.name)] + \
+                  (["--checkpoint", checkpoint] if checkpoint else []) + \
+                  job.command[2:]
+        if self.warm:
+            log.close()
+            proc = self.idle.pop() if self.idle else self.start_server(job)
+            if sys.platform.startswith("linux"):
+                psutil.Process(proc.pid).cpu_affinity(cpus)
+            request = [log.name] + command[2:]
+            proc.stdin.write("(%s)\n" % " ".join(json.dumps(a) for a in request))
+            proc.stdin.flush()
+        else:
+            def setup():
+                os.setsid()
+                if sys.platform.startswith("linux"):
+                    psutil.Process().cpu_affinity(cpus)
+
+            proc = subprocess.Popen(command, stderr=subprocess.STDOUT,
+                                    stdout=log, preexec_fn=setup, close_fds=True)
+            log.close()
+        self.running[job.id] = (job, proc, log.name, time.time())
+        return log.name
+
+    # start a warm server for jobs like the given one (the same racket and
+    # run.rkt); it runs requests written to its stdin, and answers each with a
+    # line on its stdout once the job finishes
+    def start_server(self, job):
+        return subprocess.Popen(job.command[:2] + ["--server"],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                preexec_fn=os.setsid, close_fds=True)
+
+    # wait at most `timeout` seconds (or indefinitely if None) for running jobs
+    # to finish or time out, and return a list of (job, time, timed_out, log
+    # path) for those that did
+    def wait(self, timeout=None):
+        end = None if timeout is None else time.time() + timeout
+        while True:
+            finished = self.reap()
+            now = time.time()
+            if finished or (end is None and not self.running) or \
+               (end is not None and now >= end):
+                return finished
+            deadlines = [start + job.timeout
+                           for job, proc, log, start in self.running.values()]
+            if end is not None:
+                deadlines.append(end)
+            replies = [proc.stdout for job, proc, log, start
+                         in self.running.values() if self.warm]
+            try:
+                select.select([self.wakeup] + replies, [], [],
+                              max(0, min(deadlines) - now))
+            except select.error as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+            try:
+                while os.read(self.wakeup, 4096):
+                    pass
+            except OSError:
+                pass
 
-    t = time.time()
-    proc = subprocess.Popen(job.command, stderr=subprocess.STDOUT,
-                              stdout=output_file)
-    timed_out = False
+    # collect jobs that have exited or run out of time
+    def reap(self):
+        finished = []
+        now = time.time()
+        for job, proc, log, start in self.running.values():
+            if self.done(proc):
+                finished.append((job, now - start, False, log))
+            elif now >= start + job.timeout:
+                self.kill(proc)
+                finished.append((job, job.timeout, True, log))
+        for job, t, timed_out, log in finished:
+            del self.running[job.id]
+        return finished
+
+    # stop a running job early, returning its (job, time, log path)
+    def stop(self, job_id):
+        job, proc, log, start = self.running.pop(job_id)
+        self.kill(proc)
+        return job, time.time() - start, log
+
+    # has a job's process finished its job? warm servers that have are returned
+    # to the pool, unless they died
+    def done(self, proc):
+        if not self.warm:
+            return proc.poll() is not None
+        if not select.select([proc.stdout], [], [], 0)[0]:
+            return False
+        if proc.stdout.readline():
+            self.idle.append(proc)
+        else:
+            self.kill(proc)
+        return True
 
-    try:
-        out, err = proc.communicate(timeout=job.timeout)
-        t = time.time() - t
-    except subprocess.TimeoutExpired:
-        parent = psutil.Process(proc.pid)
-        for c in parent.children(recursive=True):
+    # kill a job's whole process group, then any descendants that left it
+    def kill(self, proc):
+        try:
+            children = psutil.Process(proc.pid).children(recursive=True)
+        except psutil.NoSuchProcess:
+            children = []
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        for c in children:
             try:
                 c.kill()
-            except:
+            except (psutil.NoSuchProcess, OSError):
                 pass
-        try:
-            proc.kill()
-        except:
-            pass
-        out, err = proc.communicate()
-        t = job.timeout
-        timed_out = True
-
-    f = open(output_file.name)
-    out = f.read()
-    f.close()
-    output_file.close()
+        proc.wait()
+
+    # kill every running job, discarding their logs, and shut down idle servers
+    def kill_all(self):
+        for job, proc, log, start in self.running.values():
+            self.kill(proc)
+            remove_log(log)
+        self.running.clear()
+        for proc in self.idle:
+            proc.stdin.close()
+            proc.wait()
+        del self.idle[:]
+
+
+# clamp a requested number of threads to what this machine has (-1 = all)
+def available_threads(threads):
+    if threads == -1:
+        return psutil.cpu_count()
+    return min(psutil.cpu_count(), threads)
+
+
+## result cache ################################################################
+#
+# Results are cached in a single SQLite database (cache.db in the output
+# directory), keyed by the job's command line *and* a digest of the environment
+# that produced it: the compiled dependency closure of benchmarks/run.rkt and
+# the solver binaries Rosette runs. Changing the engine, a benchmark, Racket,
+# Rosette or a solver therefore invalidates old entries rather than silently
+# reusing them. Logs are stored zlib-compressed.
+
+# digest of everything besides the command line that determines a job's result.
+# must be called after compile_runner, since it reads the compiled runner.
+def environment_digest():
+    cwd = os.path.dirname(os.path.realpath(__file__))
+    m = hashlib.sha1()
 
-    queue.put(("end", job, t, timed_out, out))
+    # raco make records the Racket version and the SHA-1s of run.rkt and all of
+    # its (transitive) dependencies, including Rosette, in run_rkt.dep
+    with open(os.path.join(cwd, "benchmarks/compiled/run_rkt.dep")) as f:
+        m.update(portable_dep(f.read(), cwd))
 
+    # the solvers live in rosette's bin directory; only their names and
+    # contents matter, not where rosette is installed
+    for path in sorted(solver_binaries(), key=os.path.basename):
+        m.update(os.path.basename(path))
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), ""):
+                m.update(chunk)
 
-# return the cache key for a given job
-def cache_key(job):
-    m = hashlib.sha1()
-    m.update(" ".join(job.command[2:]))  # ignore executable
     return m.hexdigest()
 
 
+# the contents of a .dep file without the absolute paths it names dependencies
+# by, which differ between checkouts and hosts: paths in the repository (root)
+# become relative to it, and others (such as Rosette's) relative to their
+# collection, or just their base name. the version and SHA-1s are kept.
+def portable_dep(dep, root):
+    root = os.path.realpath(root) + os.sep
+
+    def portable(match):
+        path = match.group(2)
+        if not path.startswith("/"):
+            return match.group(0)
+        if path.startswith(root):
+            path = path[len(root):]
+        else:
+            parts = path.split("/")
+            anchors = [i for i, p in enumerate(parts)
+                         if p in ("collects", "pkgs")]
+            path = "/".join(parts[anchors[-1] + 1:]) if anchors else parts[-1]
+        return '%s"%s"' % (match.group(1), path)
+
+    return re.sub(r'(#?)"((?:[^"\\]|\\.)*)"', portable, dep)
+
+
+# paths of the solver binaries used by the installed Rosette
+def solver_binaries():
+    expr = ('(display (simplify-path (build-path '
+            '(collection-file-path "main.rkt" "rosette") ".." ".." "bin")))')
+    try:
+        bin_dir = subprocess.check_output(["racket", "-e", expr])
+    except (OSError, subprocess.CalledProcessError):
+        print "warning: cannot locate rosette's solvers; not including them in "\
+              "cache keys"
+        return []
+    if not os.path.isdir(bin_dir):
+        return []
+    paths = [os.path.join(bin_dir, f) for f in os.listdir(bin_dir)]
+    return [p for p in paths if os.path.isfile(p)]
+
+
+class ResultCache(object):
+    def __init__(self, path, environment):
+        self.environment = environment
+        self.db = sqlite3.connect(path)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS results (
+                             key TEXT PRIMARY KEY,
+                             command TEXT,
+                             environment TEXT,
+                             time REAL,
+                             timed_out INTEGER,
+                             out BLOB,
+                             created REAL,
+                             accessed REAL,
+                             events BLOB)""")
+        # caches from before events were recorded lack the column
+        columns = [row[1] for row in
+                     self.db.execute("PRAGMA table_info(results)").fetchall()]
+        if "events" not in columns:
+            self.db.execute("ALTER TABLE results ADD COLUMN events BLOB")
+        self.db.execute("""CREATE INDEX IF NOT EXISTS results_environment
+                             ON results (environment)""")
+        self.db.execute("""CREATE INDEX IF NOT EXISTS results_command
+                             ON results (command)""")
+        self.db.commit()
+
+    # return the cache key for a given job
+    def key(self, job):
+        m = hashlib.sha1()
+        m.update(" ".join(job.command[2:]))  # ignore executable and run.rkt
+        m.update("\0" + self.environment)
+        return m.hexdigest()
+
+    def __contains__(self, job):
+        cur = self.db.execute("SELECT 1 FROM results WHERE key = ?",
+                              (self.key(job),))
+        return cur.fetchone() is not None
+
+    # return (time, timed_out, log chunks, events chunks) for a cached job, or
+    # None
+    def get(self, job):
+        key = self.key(job)
+        row = self.db.execute("""SELECT time, timed_out, out, events FROM results
+                                   WHERE key = ?""", (key,)).fetchone()
+        if row is None:
+            return None
+        self.db.execute("UPDATE results SET accessed = ? WHERE key = ?",
+                        (time.time(), key))
+        self.db.commit()
+        t, timed_out, out, events = row
+        return (t, bool(timed_out), decompress_chunks(out),
+                decompress_chunks(events) if events is not None else [])
+
+    # cache a job's result, given its log and events as iterables of chunks
+    def put(self, job, t, timed_out, chunks, events):
+        now = time.time()
+        self.db.execute("""INSERT OR REPLACE INTO results
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                        (self.key(job), " ".join(job.command[2:]),
+                         self.environment, t, timed_out,
+                         sqlite3.Binary(compress_chunks(chunks)), now, now,
+                         sqlite3.Binary(compress_chunks(events))))
+        self.db.commit()
+
+    # return the recorded run times of a job's command line in any environment
+    def history(self, job):
+        rows = self.db.execute("SELECT time FROM results WHERE command = ?",
+                               (" ".join(job.command[2:]),)).fetchall()
+        return [t for (t,) in rows]
+
+    def print_stats(self):
+        rows = self.db.execute("""SELECT environment = ?, COUNT(*),
+                                         SUM(LENGTH(out)), SUM(time)
+                                    FROM results GROUP BY 1""",
+                               (self.environment,)).fetchall()
+        stats = {current: (n, size or 0, t or 0) for current, n, size, t in rows}
+        for current, label in [(1, "current"), (0, "stale")]:
+            n, size, t = stats.get(current, (0, 0, 0))
+            print "%-8s %6d entries, %8.1f MB of logs, %10.1f s of runs" % (
+                    label + ":", n, size / 1e6, t)
+
+    # delete entries from other environments and those not used in the last
+    # max_age seconds, then the least recently used ones until the logs fit
+    # in max_size bytes
+    def gc(self, max_age=None, max_size=None):
+        deleted = self.db.execute("DELETE FROM results WHERE environment != ?",
+                                  (self.environment,)).rowcount
+        if max_age is not None:
+            deleted += self.db.execute("DELETE FROM results WHERE accessed < ?",
+                                       (time.time() - max_age,)).rowcount
+        if max_size is not None:
+            total = 0
+            for key, size in self.db.execute("""SELECT key, LENGTH(out)
+                                                  FROM results
+                                                  ORDER BY accessed DESC""")\
+                                    .fetchall():
+                total += size
+                if total > max_size:
+                    self.db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    deleted += 1
+        self.db.commit()
+        self.db.execute("VACUUM")
+        print "removed %d cache entries" % deleted
+
+
+def compress_chunks(chunks):
+    z = zlib.compressobj()
+    return "".join([z.compress(chunk) for chunk in chunks] + [z.flush()])
+
+
+def decompress_chunks(data, size=1 << 16):
+    z = zlib.decompressobj()
+    data = buffer(data)
+    for i in xrange(0, len(data), size):
+        yield z.decompress(data[i:i+size])
+    yield z.flush()
+
+
+def open_cache(output_dir):
+    return ResultCache(os.path.join(output_dir, "cache.db"),
+                       environment_digest())
+
+
+## run journal #################################################################
+#
+# Each experiment's journal (<experiment>.journal in the output directory)
+# records its jobs' state transitions, one JSON object per line: "begin" when
+# the output files are created, "started" when a job is launched, and
+# "finished" once its results are in the output files, along with the sizes of
+# those files at that point. Every entry is flushed and fsynced before the run
+# moves on, so after a crash the last entry says exactly which results made it
+# to the output files. run.py --resume truncates the output files back to those
+# sizes (dropping any half-written results) and carries on appending, skipping
+# the jobs that finished. Jobs that were running restart from their
+# checkpoints (see benchmarks/run.rkt --checkpoint).
+
+class Journal(object):
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.lock = threading.Lock()
+        self.done = set()  # commands of finished jobs
+        self.sizes = None  # output file sizes after the last complete entry
+        self.length = 0  # bytes of complete entries (a crash may tear the last)
+        if os.path.exists(path):
+            for line in chunk_lines(file_chunks(path)):
+                self.length += len(line)
+                entry = json.loads(line)
+                if entry["state"] == "finished":
+                    self.done.add(entry["command"])
+                if "sizes" in entry:
+                    self.sizes = entry["sizes"]
+
+    # has the journal recorded this job as finished?
+    def finished(self, job):
+        return " ".join(job.command[2:]) in self.done
+
+    # start writing the journal, either afresh or appending to it
+    def open(self, resume):
+        self.file = open(self.path, "a" if resume else "w")
+        if resume:
+            self.file.truncate(self.length)
+
+    def record(self, state, job=None, sizes=None):
+        entry = {"state": state, "time": time.time()}
+        if job is not None:
+            entry["command"] = " ".join(job.command[2:])
+            entry["ident"] = job.ident
+        if sizes is not None:
+            entry["sizes"] = sizes
+        with self.lock:
+            self.file.write(json.dumps(entry, sort_keys=True) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+# open an experiment's output files, returning them and whether the CSV header
+# has been written yet: afresh, or when resuming from a journal, for appending
+# after truncating them to their journaled sizes
+def open_outputs(paths, sizes):
+    if sizes is None:
+        return [open(path, "w") for path in paths], False
+    files = []
+    for path, size in zip(paths, sizes):
+        f = open(path, "a")
+        f.truncate(size)
+        files.append(f)
+    return files, sizes[0] > 0
+
+
 def execute_jobs(jobs, threads, job_name, output_dir, plot_file, args):
-    # set up the cache
-    cache_dir = os.path.join(output_dir, "cache")
-    if not os.path.exists(cache_dir):
-        os.mkdir(cache_dir)
+    # the cache key depends on the compiled runner
+    compile_runner()
+    cache = open_cache(output_dir)
+
     # find things in the cache if we're allowed
     cached = []
     if not args.force:
         for job in jobs[:]:
-            key = cache_key(job)
-            path = os.path.join(cache_dir, key + ".json")
-            if os.path.exists(path):
-                cached.append((job, path))
+            if job in cache:
+                cached.append(job)
                 jobs.remove(job)
 
+    # when resuming, skip jobs whose results are already in the output files
+    journal = Journal(os.path.join(output_dir, "%s.journal" % job_name))
+    resume = args.resume and journal.sizes is not None
+    finished = []
+    if resume:
+        finished = [job for job in cached + jobs if journal.finished(job)]
+        cached = [job for job in cached if job not in finished]
+        jobs = [job for job in jobs if job not in finished]
+
     if args.dry_run:
+        if finished:
+            print "already finished:"
+            for i, job in enumerate(finished):
+                print "  %d: %s" % (i, " ".join(job.command))
+            if cached or jobs:
+                print ""
         if cached:
             print "in cache:"
-            for i, (job, path) in enumerate(cached):
+            for i, job in enumerate(cached):
                 print "  %d: %s (%s)" % (i, " ".join(job.command),
-                                         cache_key(job))
+                                         cache.key(job))
             if jobs:
                 print ""
         if jobs:
@@ -258,129 +735,148 @@ def execute_jobs(jobs, threads, job_name, output_dir, plot_file, args):
                 print "  %d: %s" % (i, " ".join(job.command))
         sys.exit(0)
 
-    # do we have enough actual threads to run every remaining job?
-    if threads == -1:
-        threads = psutil.cpu_count()
-    else:
-        threads = min(psutil.cpu_count(), threads)
-    needed_threads = max([0] + [job.threads for job in jobs])
-    if needed_threads > threads:
-        raise Exception("not enough threads: need %d, have %d" % (
-                          needed_threads, threads))
+    # do we have enough actual threads to run every remaining job? (when
+    # coordinating, the worker agents run the jobs, so this is their problem)
+    if not args.coordinator:
+        threads = available_threads(threads)
+        needed_threads = max([0] + [job.threads for job in jobs])
+        if needed_threads > threads:
+            raise Exception("not enough threads: need %d, have %d" % (
+                              needed_threads, threads))
 
-    # compile benchmark runner if necessary
-    if jobs:
-        compile_runner()
+    # estimate durations from the results so far, before opening the output
+    # files truncates this experiment's (the history that matches it best)
+    estimates = estimate_durations(jobs, output_dir, cache)
 
     # output files
-    data_file = open(os.path.join(output_dir, "%s.out.csv" % job_name), "w")
-    output_file = open(os.path.join(output_dir, "%s.out.txt" % job_name), "w")
-    output_file.write("experiment: %s\n" % " ".join(sys.argv))
-    output_file.write("start: %s\n" % datetime.datetime.now())
-    output_file.write("cpu: %s\n" % cpuinfo.get_cpu_info()['brand'])
-    header_printed = False
-
-    def on_job_complete(job, t, timed_out, out):
+    outputs = [os.path.join(output_dir, "%s.%s" % (job_name, ext))
+                 for ext in ["out.csv", "out.txt", "events.jsonl"]]
+    files, header = open_outputs(outputs, journal.sizes if resume else None)
+    data_file, output_file, events_file = files
+    header_printed = [True] if header else []  # non-empty once it's written
+    journal.open(resume)
+    if resume:
+        print "resuming: %d jobs already finished" % len(finished)
+        journal.record("resume")
+    else:
+        output_file.write("experiment: %s\n" % " ".join(sys.argv))
+        output_file.write("start: %s\n" % datetime.datetime.now())
+        output_file.write("cpu: %s\n" % cpuinfo.get_cpu_info()['brand'])
+        output_file.flush()
+        journal.record("begin", sizes=[os.path.getsize(p) for p in outputs])
+
+    # with --resume, jobs save their progress here, to resume from if they are
+    # interrupted. other runs start from scratch, so any checkpoints left by an
+    # interrupted run are stale, and removed. resumed jobs' times are partial.
+    checkpoint_dir = os.path.join(output_dir, "checkpoints")
+    if not resume and os.path.exists(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir)
+    if not os.path.exists(checkpoint_dir):
+        os.mkdir(checkpoint_dir)
+    checkpoints = {}
+    if args.resume:
+        checkpoints = {job.id: os.path.join(checkpoint_dir,
+                                            cache.key(job) + ".ckpt")
+                         for job in jobs}
+    resumed = set(i for i, path in checkpoints.items() if os.path.exists(path))
+
+    policy = SweepPolicy(args.budget)
+
+    # record a job's result in the output files. decision is why the job ended
+    # (see SweepPolicy); by default, "timeout" or "complete". skipped jobs have
+    # no time.
+    def on_job_complete(job, t, timed_out, chunks, events, decision=None):
+        decision = decision or ("timeout" if timed_out else "complete")
+        policy.record(job, decision)
+
+        # write to output file
+        output_file.write("*** %s\n" % job.ident)
+        for chunk in chunks:
+            output_file.write(chunk)
+        if t is None:
+            output_file.write("*** skipped (%s)\n" % decision)
+        elif decision == "complete":
+            output_file.write("*** %s\n" % t)
+        elif decision == "timeout":
+            output_file.write("*** timeout (%s)\n" % t)
+        elif decision == "resumed":
+            output_file.write("*** %s (resumed)\n" % t)
+        else:
+            output_file.write("*** stopped: %s (%s)\n" % (decision, t))
+        output_file.flush()
+
+        # write to events file, adding the job's identifier to each event (by
+        # splicing it into the object, rather than re-encoding every event)
+        tag = '{"job": %s, ' % json.dumps(job.ident, sort_keys=True)
+        snapshots = {}
+        for line in chunk_lines(events):
+            if line.startswith("{"):
+                events_file.write(tag + line[1:])
+                if '"event":"profile"' in line:
+                    add_profile_event(snapshots, json.loads(line))
+        events_file.flush()
+        profile = profile_totals(snapshots)
+
         # write to data file
         if not header_printed:
-            keys = sorted(job.ident) + ["time", "timeout"]
+            keys = sorted(job.ident) + RESULT_COLUMNS
             data_file.write(",".join("\"%s\"" % k for k in keys) + "\n")
+            header_printed.append(True)
         for k in sorted(job.ident):
             data_file.write("\"%s\"," % job.ident[k])
-        data_file.write("%.3f,%s\n" % (t, timed_out))
+        data_file.write("%s,%s,%s" % ("" if t is None else "%.3f" % t,
+                                      timed_out, decision))
+        for phase in PROFILE_PHASES:
+            data_file.write(",%s" % ("%.3f" % profile[phase]
+                                     if phase in profile else ""))
+        data_file.write("\n")
         data_file.flush()
 
-        # write to output file
-        output_file.write("*** %s\n" % job.ident)
-        output_file.write(out.encode('utf8', 'replace'))
-        output_file.write("*** %s\n" % (
-                            "timeout (%s)" % t if timed_out else t))
-        output_file.flush()
+        journal.record("finished", job, [os.path.getsize(p) for p in outputs])
+
+    def on_job_started(job):
+        journal.record("started", job)
+
+    # record a freshly computed result, given the path of its log, in the
+    # output files and the cache. results cut short by a policy are not cached,
+    # since they depend on the policy rather than just the job, and neither
+    # are those of resumed jobs, whose time covers only part of the search.
+    def on_job_finished(job, t, timed_out, log, decision=None):
+        if decision is None and job.id in resumed:
+            decision = "resumed"
+        if decision is None:
+            cache.put(job, t, timed_out, file_chunks(log), events_chunks(log))
+        on_job_complete(job, t, timed_out, file_chunks(log), events_chunks(log),
+                        decision)
+        remove_log(log)
+        if job.id in checkpoints:
+            for path in glob.glob(checkpoints[job.id] + "*"):
+                os.remove(path)
+
+    def on_job_skipped(job, decision):
+        print "skipping (%s): %s" % (decision, " ".join(job.command))
+        on_job_complete(job, None, True, [], [], decision)
 
     # first process all results that are cached
-    for job, path in cached:
-        with open(path) as f:
-            data = json.load(f)
+    for job in cached:
+        t, timed_out, chunks, events = cache.get(job)
         cmd = " ".join(job.command)
-        print "cached: %s\n  (%s)" % (cmd, cache_key(job))
-        on_job_complete(job, data["time"], data["timed_out"], data["out"])
-        header_printed = True
-
-    total_jobs = len(jobs)
-
-    running_jobs = {}
-    threads_used = 0
-    cpus = range(psutil.cpu_count())
-    queue = multiprocessing.Queue()
-
-    # schedule jobs in descending order of threads so we can use smaller jobs to
-    # fill gaps
-    jobs = sorted(jobs, key=lambda j: j.threads, reverse=True)
+        print "cached: %s\n  (%s)" % (cmd, cache.key(job))
+        on_job_complete(job, t, timed_out, chunks, events)
 
-    # spawn jobs that use at most a given number of threads on the given cpus
-    def launch_more_jobs(threads, cpus):
-        threads_used = 0
-        cpus_available = cpus
-        for job in jobs[:]:
-            if threads_used + job.threads <= threads:
-                my_cpus = cpus_available[:job.threads]
-                cpus_available = cpus_available[job.threads:]
-                p = multiprocessing.Process(target=run_job, args=(queue, job))
-                p.start()
-                if sys.platform.startswith("linux"):
-                    pp = psutil.Process(p.pid)
-                    pp.cpu_affinity(my_cpus)
-                running_jobs[job.id] = (p, my_cpus)
-                threads_used += job.threads
-                jobs.remove(job)
-                if args.sequential:
-                    break
-        return threads_used, cpus_available
-
-    # spawn initial threads
-    threads_used, cpus = launch_more_jobs(threads, cpus)
-
-    while running_jobs:
-        evt = queue.get()
-        if evt[0] == "start":
-            start, job, output_name = evt
-            cmd = " ".join(job.command)
-            status = "[%d jobs: %d complete, %d running, %d remaining]" % (
-                        total_jobs, total_jobs - len(running_jobs) - len(jobs),
-                        len(running_jobs), len(jobs))
-            print "starting: %s\n  --> %s\n  %s" % (cmd, output_name, status)
-        elif evt[0] == "end":
-            end, job, t, timed_out, out = evt
-
-            # write to data file
-            on_job_complete(job, t, timed_out, out)
-            header_printed = True
-
-            # write to cache
-            key = cache_key(job)
-            path = os.path.join(cache_dir, key + ".json")
-            with open(path, "w") as f:
-                json.dump({"command": job.command, "time": t, 
-                           "timed_out": timed_out, "out": out}, 
-                           f, indent=2)
-
-            p, c = running_jobs[job.id]
-            p.join()
-            del running_jobs[job.id]
-            threads_used -= job.threads
-            cpus = sorted(cpus + c)
-
-            status = "[%d jobs: %d complete, %d running, %d remaining]" % (
-                        total_jobs, total_jobs - len(running_jobs) - len(jobs),
-                        len(running_jobs), len(jobs))
-            print "finished: %s\n  %s" % (" ".join(job.command), status)
-
-            t, c = launch_more_jobs(threads - threads_used, cpus)
-            threads_used += t
-            cpus = c
+    if args.coordinator:
+        if jobs:
+            address = parse_address(args.coordinator, "0.0.0.0")
+            run_coordinator(jobs, address, cache.environment, estimates,
+                            on_job_started, on_job_finished)
+    else:
+        run_local_jobs(jobs, threads, estimates, checkpoints, policy,
+                       on_job_started, on_job_finished, on_job_skipped, args)
 
     output_file.close()
     data_file.close()
+    events_file.close()
+    journal.close()
 
     if plot_file and not args.no_post_process:
         path = os.path.join(os.getcwd(), "experiments/plots/" + plot_file)
@@ -392,11 +888,824 @@ def execute_jobs(jobs, threads, job_name, output_dir, plot_file, args):
                                       stderr=subprocess.STDOUT)
 
 
+# run jobs on this machine, using at most the given number of threads at once,
+# and ending or skipping them early as the policy decides
+def run_local_jobs(jobs, threads, estimates, checkpoints, policy,
+                   on_job_started, on_job_finished, on_job_skipped, args):
+    total_jobs = len(jobs)
+
+    runner = JobRunner(args.warm)
+    running_cpus = {}  # job id -> cpus
+    free_cpus = range(psutil.cpu_count())
+    nodes = numa_nodes()
+    progress = {}  # job id -> JobProgress, for jobs with a stable_cost policy
+
+    predicted = predict_makespan(jobs, threads, estimates)
+    start_time = time.time()
+    if jobs:
+        print "predicted makespan: %.1fs" % predicted
+    originals = {job.id: job for job in jobs}  # before any budget cuts
+
+    jobs = longest_first(jobs, estimates)
+
+    def status():
+        return "[%d jobs: %d complete, %d running, %d remaining]" % (
+                 total_jobs, total_jobs - len(runner.running) - len(jobs),
+                 len(runner.running), len(jobs))
+
+    # the run's status for the monitor, with an ETA from the estimates
+    def monitor_status():
+        running = running_status(runner, running_cpus, estimates)
+        left = predict_makespan(list(jobs), threads, estimates,
+                                [(max(0, j["estimate"] - j["elapsed"]),
+                                  j["threads"]) for j in running])
+        return {"summary": "%s; ETA %s (%.0fs)" % (
+                             status(), time.strftime("%H:%M:%S",
+                                          time.localtime(time.time() + left)),
+                             left),
+                "eta": time.time() + left, "jobs": running}
+
+    if args.monitor:
+        Monitor(parse_address(args.monitor, "localhost"), monitor_status)
+
+    # spawn as many jobs as the scheduler picks, after skipping any that the
+    # policy rules out
+    def launch_more_jobs():
+        now = time.time()
+        for job in jobs[:]:
+            decision = policy.skip(job, now)
+            if decision:
+                jobs.remove(job)
+                on_job_skipped(job, decision)
+        running = [(t + estimates[job.id], job.threads)
+                     for job, p, l, t in runner.running.values()]
+        free = threads - sum(job.threads for job, p, l, t in runner.running.values())
+        picked = pick_jobs(jobs, free, running, now, estimates)
+        if args.sequential and not runner.running:
+            picked = picked[:1]
+        elif args.sequential:
+            picked = []
+        for job in picked:
+            my_cpus = pick_cpus(free_cpus, job.threads, nodes)
+            for c in my_cpus:
+                free_cpus.remove(c)
+            running_cpus[job.id] = my_cpus
+            jobs.remove(job)
+            on_job_started(job)
+            # the runner enforces the job's timeout, less any budget cut
+            limited = job._replace(timeout=policy.timeout(job, now))
+            log = runner.start(limited, my_cpus, checkpoints.get(job.id))
+            if "stable_cost" in job.policy:
+                progress[job.id] = JobProgress(log)
+            print "starting: %s\n  --> %s\n  %s" % (" ".join(job.command), log,
+                                                    status())
+
+    try:
+        # spawn initial jobs
+        launch_more_jobs()
+
+        while runner.running:
+            # poll the progress of jobs that may stop once their cost is stable
+            finished = runner.wait(POLICY_POLL_INTERVAL if progress else None)
+            finished = [(job, t, timed_out, log, None)
+                          for job, t, timed_out, log in finished]
+            for i, p in progress.items():
+                if i in runner.running and policy.stop(runner.running[i][0], p):
+                    job, t, log = runner.stop(i)
+                    finished.append((job, t, True, log, "stable-cost"))
+
+            for job, t, timed_out, log, decision in finished:
+                # a timeout shortened by the budget is the budget's decision
+                original = originals[job.id]
+                if timed_out and decision is None and \
+                   job.timeout < original.timeout:
+                    decision = "budget"
+
+                # write to data file and cache
+                on_job_finished(original, t, timed_out, log, decision)
+                progress.pop(job.id, None)
+
+                free_cpus.extend(running_cpus.pop(job.id))
+                free_cpus.sort()
+
+                print "finished: %s (%.1fs, predicted %.1fs%s)\n  %s" % (
+                        " ".join(job.command), t, estimates[job.id],
+                        "; %s" % decision if decision else "", status())
+
+            launch_more_jobs()
+    finally:
+        runner.kill_all()
+
+    if total_jobs:
+        print "makespan: %.1fs (predicted %.1fs)" % (time.time() - start_time,
+                                                      predicted)
+
+
+## scheduling ##################################################################
+#
+# Jobs are started longest-first according to their estimated durations, with
+# EASY backfilling: if the longest waiting job does not fit, it reserves the
+# earliest time at which enough threads will be free, and shorter jobs may jump
+# ahead of it only if they will not delay that reservation.
+
+# columns of a *.out.csv file that are results rather than job identifiers
+# the phases profiled by run.rkt --profile, whose total times (in seconds,
+# over all places and sketches) are also result columns
+PROFILE_PHASES = ["symbolic", "encode", "synthesize", "prefilter", "verify",
+                  "serialize", "deserialize", "save", "idle"]
+RESULT_COLUMNS = ["time", "timeout", "decision"] + \
+                 ["profile_%s" % phase for phase in PROFILE_PHASES]
+
+
+# add a profile event's time to the total for its phase in its place's latest
+# profile snapshot. snapshots maps each place to (snapshot number, {phase:
+# secs}); a search logs every place's totals so far every so often and at its
+# end, so each snapshot replaces the place's earlier ones, and a job killed at
+# its time limit still has the profile of its last snapshot
+def add_profile_event(snapshots, evt):
+    if evt.get("event") != "profile":
+        return
+    place, n = evt.get("place"), evt.get("snapshot", 0)
+    last, profile = snapshots.get(place, (None, {}))
+    if last is not None and n < last:
+        return
+    if n != last:
+        profile = {}
+        snapshots[place] = (n, profile)
+    phase = evt.get("phase")
+    profile[phase] = profile.get(phase, 0) + (evt.get("time") or 0)
+
+
+# the total time of each phase over every place's latest profile snapshot
+def profile_totals(snapshots):
+    totals = {}
+    for n, profile in snapshots.values():
+        for phase, secs in profile.items():
+            totals[phase] = totals.get(phase, 0) + secs
+    return totals
+
+
+# estimate how long each job will take, in seconds, from previous runs of the
+# same command in the cache, or else from previous runs recorded in *.out.csv
+# files in the output directory with the same identifier, benchmark, or group.
+# jobs we know nothing about are assumed to run until they time out.
+def estimate_durations(jobs, output_dir, cache):
+    history = collections.defaultdict(list)
+    for path in glob.glob(os.path.join(output_dir, "*.out.csv")):
+        with open(path) as f:
+            for row in csv.DictReader(f):
+                if row.get("decision") == "resumed":
+                    continue  # a partial time
+                try:
+                    t = float(row["time"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                for k in RESULT_COLUMNS:
+                    row.pop(k, None)
+                for key in history_keys(row):
+                    history[key].append(t)
+
+    estimates = {}
+    for job in jobs:
+        ident = {k: str(v) for k, v in job.ident.items()}
+        times = cache.history(job)
+        for key in history_keys(ident):
+            if times:
+                break
+            times = history[key]
+        if times:
+            estimates[job.id] = min(sum(times) / len(times), job.timeout)
+        else:
+            estimates[job.id] = job.timeout
+    return estimates
+
+
+# keys under which a run with the given identifier is recorded, most specific
+# first
+def history_keys(ident):
+    return [("ident",) + tuple(sorted(ident.items())),
+            ("benchmark", ident.get("benchmark"), ident.get("group")),
+            ("group", ident.get("group"))]
+
+
+# order jobs by priority (see SweepPolicy), then longest-first, breaking ties by
+# threads
+def longest_first(jobs, estimates):
+    return sorted(jobs, key=lambda j: (j.policy.get("priority", 0),
+                                       estimates[j.id], j.threads),
+                  reverse=True)
+
+
+# choose which jobs from `waiting` (ordered longest-first) to start now, given
+# the number of free threads and the (estimated end time, threads) of each
+# running job
+def pick_jobs(waiting, free, running, now, estimates):
+    picked = []
+    reserved_at = None  # when the first job that doesn't fit can start
+    spare = 0           # threads free at that time beyond what it needs
+    for job in waiting:
+        end = now + estimates[job.id]
+        if reserved_at is None:
+            if job.threads <= free:
+                picked.append(job)
+                free -= job.threads
+                running = running + [(end, job.threads)]
+                continue
+            avail = free
+            for t, threads in sorted(running):
+                avail += threads
+                if avail >= job.threads:
+                    reserved_at, spare = max(t, now), avail - job.threads
+                    break
+            else:
+                return picked  # can never fit; nothing can be reserved
+        elif job.threads <= free and (end <= reserved_at or job.threads <= spare):
+            picked.append(job)
+            free -= job.threads
+            if end > reserved_at:
+                spare -= job.threads
+    return picked
+
+
+# simulate the scheduler on the estimated durations to predict the makespan,
+# given the (estimated remaining time, threads) of any jobs already running
+def predict_makespan(jobs, threads, estimates, running=()):
+    waiting = longest_first(jobs, estimates)
+    running = list(running)
+    now = 0.0
+    free = threads - sum(n for t, n in running)
+    while waiting or running:
+        for job in pick_jobs(waiting, free, running, now, estimates):
+            waiting.remove(job)
+            free -= job.threads
+            running.append((now + estimates[job.id], job.threads))
+        if not running:
+            break
+        running.sort()
+        now, threads_done = running.pop(0)
+        free += threads_done
+    return now
+
+
+# parse a Linux cpulist string such as "0-3,8-11"
+def parse_cpulist(s):
+    cpus = []
+    for part in s.strip().split(","):
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+# the machine's NUMA nodes, as lists of cpu numbers
+def numa_nodes():
+    nodes = []
+    for path in glob.glob("/sys/devices/system/node/node*/cpulist"):
+        with open(path) as f:
+            nodes.append(parse_cpulist(f.read()))
+    cpus = range(psutil.cpu_count())
+    nodes = [[c for c in node if c in cpus] for node in nodes]
+    nodes = [node for node in nodes if node]
+    # cpus that no node claims form a node of their own
+    rest = sorted(set(cpus) - set(c for node in nodes for c in node))
+    return nodes + [rest] if rest else nodes
+
+
+# choose n of the free cpus for a job: from the fullest NUMA node that can hold
+# all of them if there is one, otherwise from as few nodes as possible
+def pick_cpus(free_cpus, n, nodes):
+    by_node = [sorted(set(free_cpus) & set(node)) for node in nodes]
+    fits = [cpus for cpus in by_node if len(cpus) >= n]
+    if fits:
+        return min(fits, key=len)[:n]
+    picked = []
+    for cpus in sorted(by_node, key=len, reverse=True):
+        picked.extend(cpus[:n - len(picked)])
+    return picked
+
+
+## policies ####################################################################
+#
+# Policies end a sweep's jobs early once their outcome is clear, and each
+# result's "decision" column in *.out.csv records why its job ended:
+#   complete      the job finished
+#   timeout       the job ran out of its configuration's timeout
+#   max-timeouts  skipped: its configuration's "max_timeouts" argument is the
+#                 number of its jobs that may time out before the rest are
+#                 skipped
+#   stable-cost   stopped: its best cost had not changed for its configuration's
+#                 "stable_cost" seconds, with no sketches left to start
+#   budget        skipped or stopped: the sweep's --budget seconds ran out.
+#                 jobs start in order of their configuration's "priority"
+#                 (higher first; default 0), so the budget goes to them first.
+#   resumed       the job finished, resuming from the checkpoint of an
+#                 interrupted run (with --resume), so its time is partial
+# Skipped jobs have no time, and count as timeouts. Results of stopped jobs are
+# not cached, and neither are resumed jobs'. Policies only apply to local runs,
+# not coordinators'.
+
+# seconds between checks of running jobs' stable_cost policies
+POLICY_POLL_INTERVAL = 5
+
+
+class SweepPolicy(object):
+    def __init__(self, budget=None):
+        self.deadline = None if budget is None else time.time() + budget
+        self.timeouts = collections.Counter()  # config -> jobs timed out
+        self.best = {}  # job id -> (best cost, when it was first seen)
+
+    # note a job's result
+    def record(self, job, decision):
+        if decision == "timeout":
+            self.timeouts[job.config] += 1
+
+    # should a job that has not started be skipped? returns the decision if so
+    def skip(self, job, now):
+        if "max_timeouts" in job.policy and \
+           self.timeouts[job.config] >= job.policy["max_timeouts"]:
+            return "max-timeouts"
+        if self.deadline is not None and now >= self.deadline:
+            return "budget"
+        return None
+
+    # the timeout for a job starting now
+    def timeout(self, job, now):
+        if self.deadline is None:
+            return job.timeout
+        return min(job.timeout, self.deadline - now)
+
+    # should a running job stop now, given its JobProgress?
+    def stop(self, job, progress):
+        progress.update()
+        now = time.time()
+        if progress.best_cost is None:
+            return False
+        cost, since = self.best.get(job.id, (None, now))
+        if cost != progress.best_cost:
+            self.best[job.id] = (progress.best_cost, now)
+            return False
+        return progress.unstarted == 0 and \
+               now - since >= job.policy["stable_cost"]
+
+
+## live monitor ################################################################
+#
+# With --monitor [HOST:]PORT, run.py serves the state of its running jobs over
+# HTTP while it runs: GET / for a plain-text page, GET /status.json for the
+# same as JSON. For each running job it shows the elapsed and estimated time,
+# the cpus it is pinned to and their utilization, its search's progress (read
+# from the job's events file: current sketch per place, best cost, sketches
+# complete and remaining, samples, and how long since its last event, which
+# tells a stuck solver from a slow one), and the tail of its log. Local runs
+# also report an ETA, predicted from the estimated durations.
+
+# lines of each running job's log to show
+MONITOR_TAIL_LINES = 5
+
+
+# Follows the events a running job has written so far to report its search's
+# progress, parsing only what is new on each update.
+class JobProgress(object):
+    def __init__(self, log):
+        self.path = events_path(log)
+        self.offset = 0
+        self.sketches = {}  # place -> sketch it is running
+        self.best_cost = None
+        self.complete = 0
+        self.remaining = None  # sketches not yet decided, including running ones
+        self.unstarted = None  # sketches not yet started (None if unbounded)
+        self.samples = 0
+        self.events = 0
+        self.last_event = None  # when the last event was written
+
+    def update(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # still being written
+                self.offset += len(line)
+                self.handle(json.loads(line))
+                self.events += 1
+        if self.events:
+            self.last_event = os.path.getmtime(self.path)
+
+    def handle(self, evt):
+        if "unstarted" in evt:
+            self.unstarted = evt["unstarted"]
+        if evt["event"] == "sketch-start":
+            self.sketches[evt["place"]] = evt["sketch"]
+            self.complete = evt["complete"]
+            self.remaining = evt["remaining"]
+            self.samples = evt["samples"]
+        elif evt["event"] == "best-cost":
+            self.best_cost = evt["cost"]
+            self.remaining = evt["remaining"]
+        elif evt["event"] == "samples":
+            self.samples = evt["total"]
+        elif evt["event"] == "search-end":
+            self.sketches.clear()
+
+
+# the last n lines of a file
+def tail_lines(path, n, size=1 << 13):
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - size))
+        return f.read().splitlines()[-n:]
+
+
+# Serves the monitor's pages. status is a function returning the state to
+# show, as a dict with an entry "jobs" listing the running jobs and any
+# others that describe the run as a whole; it is called from the server's
+# threads, so it must only read state that the main thread replaces
+# atomically.
+class Monitor(object):
+    def __init__(self, address, status):
+        self.status = status
+        self.progress = {}  # job id -> JobProgress
+        self.lock = threading.Lock()
+        monitor = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/status.json":
+                    body, kind = json.dumps(monitor.snapshot()), "application/json"
+                elif self.path == "/":
+                    body, kind = monitor.render(), "text/plain"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = Server(address, Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        print "monitor: http://%s:%d/" % address
+
+    # the run's status, with each running job's progress and cpu utilization
+    def snapshot(self):
+        status = self.status()
+        load = psutil.cpu_percent(percpu=True)
+        with self.lock:
+            for job in status["jobs"]:
+                if job["id"] not in self.progress:
+                    self.progress[job["id"]] = JobProgress(job["log"])
+                progress = self.progress[job["id"]]
+                progress.update()
+                job["sketches"] = progress.sketches
+                job["best_cost"] = progress.best_cost
+                job["complete"] = progress.complete
+                job["remaining"] = progress.remaining
+                job["samples"] = progress.samples
+                job["events"] = progress.events
+                job["idle"] = None if progress.last_event is None else \
+                                time.time() - progress.last_event
+                cpus = [c for c in job["cpus"] if c < len(load)]
+                job["cpu_percent"] = sum(load[c] for c in cpus) / len(cpus) \
+                                       if cpus else None
+                job["tail"] = [line.decode("utf-8", "replace") for line in
+                                 tail_lines(job["log"], MONITOR_TAIL_LINES)]
+            # forget jobs that are no longer running
+            running = set(job["id"] for job in status["jobs"])
+            for i in self.progress.keys():
+                if i not in running:
+                    del self.progress[i]
+        return status
+
+    def render(self):
+        status = self.snapshot()
+        lines = [status["summary"]]
+        for job in status["jobs"]:
+            lines.append("")
+            lines.append("[%d] %s" % (job["id"], ", ".join(
+                           "%s: %s" % kv for kv in sorted(job["ident"].items()))))
+            lines.append("  elapsed %.1fs%s; cpus %s at %s" % (
+                           job["elapsed"],
+                           " of ~%.1fs" % job["estimate"]
+                             if job.get("estimate") is not None else "",
+                           job["cpus"],
+                           "%.0f%%" % job["cpu_percent"]
+                             if job["cpu_percent"] is not None else "?"))
+            lines.append("  best cost %s; %s complete, %s remaining; "
+                         "%s samples; %s" % (
+                           job["best_cost"], job["complete"],
+                           job["remaining"] if job["remaining"] is not None
+                             else "?",
+                           job["samples"],
+                           "last event %.1fs ago" % job["idle"]
+                             if job["idle"] is not None else "no events yet"))
+            for place, sketch in sorted(job["sketches"].items()):
+                lines.append("  p%s: %s" % (place, sketch))
+            for line in job["tail"]:
+                lines.append("  | %s" % line)
+        return "\n".join(lines) + "\n"
+
+
+# the status of a runner's jobs, for a Monitor
+def running_status(runner, running_cpus, estimates=None):
+    now = time.time()
+    jobs = []
+    for job, proc, log, start in runner.running.values():
+        jobs.append({"id": job.id, "ident": job.ident,
+                     "command": " ".join(job.command), "log": log,
+                     "threads": job.threads, "elapsed": now - start,
+                     "timeout": job.timeout,
+                     "estimate": estimates.get(job.id) if estimates else None,
+                     "cpus": running_cpus.get(job.id, [])})
+    return sorted(jobs, key=lambda j: j["id"])
+
+
+## distributed execution #######################################################
+#
+# A coordinator (run.py --coordinator [HOST:]PORT experiment.json) serves the
+# experiment's jobs to worker agents (run.py --worker HOST:PORT -n THREADS) over
+# TCP, and collects their results into its own CSV/TXT/cache files. Messages are
+# newline-delimited JSON objects:
+#   worker -> coordinator: {"type": "request", "threads": n,
+#                           "capacity": total threads, "environment": digest}
+#                          {"type": "result", "id": .., "time": ..,
+#                           "timed_out": .., "log": encode_log(..),
+#                           "events": encode_log(..) or null}
+#   coordinator -> worker: {"type": "job", "job": {..}} in reply to a request
+#                          for a job that fits in n threads,
+#                          {"type": "wait"} if there is nothing to run yet, or
+#                          {"type": "done"} once every job has completed, or
+#                          {"type": "error", "reason": ..} if the worker's
+#                          environment_digest differs from the coordinator's.
+# If a worker's connection drops, its unfinished jobs are re-queued. Once every
+# connected worker has reported its capacity, jobs that need more threads than
+# any of them has are rejected (and reported), rather than waited on forever.
+
+# parse a "host:port" (or just "port") string into an address tuple
+def parse_address(addr, default_host):
+    host, _, port = addr.rpartition(":")
+    return (host or default_host, int(port))
+
+
+def send_message(f, msg):
+    f.write(json.dumps(msg) + "\n")
+    f.flush()
+
+
+def recv_message(f):
+    line = f.readline()
+    if not line:
+        raise EOFError("connection closed")
+    return json.loads(line)
+
+
+# serve jobs to worker agents until every job has a result. workers must have
+# the given environment digest, so that their results are valid cache entries.
+# jobs are handed out longest-first, each to the first worker with room for it.
+def run_coordinator(jobs, address, environment, estimates, on_job_started,
+                    on_job_finished):
+    total_jobs = len(jobs)
+    lock = threading.Lock()
+    pending = longest_first(jobs, estimates)
+    assigned = {}  # worker name -> {job id: job}
+    capacity = {}  # worker name -> total threads, once it has reported it
+    results = Queue.Queue()
+
+    # reject the pending jobs that no connected worker can ever run. must be
+    # called with the lock held.
+    def reject_oversized():
+        if not capacity or set(capacity) != set(assigned):
+            return
+        largest = max(capacity.values())
+        for job in [j for j in pending if j.threads > largest]:
+            pending.remove(job)
+            results.put((job, None, None, None,
+                         "needs %d threads, but the largest worker has %d" % (
+                           job.threads, largest)))
+
+    def status(complete):
+        with lock:
+            running = sum(len(js) for js in assigned.values())
+            remaining = len(pending)
+        return "[%d jobs: %d complete, %d running, %d remaining]" % (
+                 total_jobs, complete, running, remaining)
+
+    class Handler(SocketServer.StreamRequestHandler):
+        def handle(self):
+            self.request.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            name = "%s:%d" % self.client_address
+            mine = {}
+            with lock:
+                assigned[name] = mine
+            print "worker connected: %s" % name
+            try:
+                while True:
+                    msg = recv_message(self.rfile)
+                    if msg["type"] == "request":
+                        if msg["environment"] != environment:
+                            send_message(self.wfile, {"type": "error",
+                              "reason": "worker's racket/rosette/solver/source "
+                                        "environment differs from the "
+                                        "coordinator's"})
+                            raise ValueError("environment mismatch")
+                        with lock:
+                            capacity[name] = msg.get("capacity", msg["threads"])
+                            reject_oversized()
+                            job = next((j for j in pending
+                                          if j.threads <= msg["threads"]), None)
+                            if job is not None:
+                                pending.remove(job)
+                                mine[job.id] = job
+                            busy = pending or any(assigned.values())
+                        if job is not None:
+                            on_job_started(job)
+                            print "starting on %s: %s" % (
+                                    name, " ".join(job.command))
+                            send_message(self.wfile,
+                                         {"type": "job", "job": job._asdict()})
+                        elif busy:
+                            send_message(self.wfile, {"type": "wait"})
+                        else:
+                            send_message(self.wfile, {"type": "done"})
+                    elif msg["type"] == "result":
+                        with lock:
+                            job = mine.pop(msg["id"])
+                        log = decode_log(msg["log"])
+                        if msg.get("events") is not None:
+                            decode_log(msg["events"], events_path(log))
+                        results.put((job, msg["time"], msg["timed_out"],
+                                     log, name))
+                    else:
+                        raise ValueError("bad message: %s" % msg)
+            except (EOFError, ValueError, KeyError, socket.error) as e:
+                print "worker disconnected: %s (%s)" % (name, e)
+            finally:
+                with lock:
+                    del assigned[name]
+                    capacity.pop(name, None)
+                    for job in mine.values():
+                        print "re-queueing: %s" % " ".join(job.command)
+                        pending.append(job)
+                    pending[:] = longest_first(pending, estimates)
+
+    class Server(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+        allow_reuse_address = True
+        daemon_threads = True
+
+    server = Server(address, Handler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    print "coordinating %d jobs on %s:%d" % ((total_jobs,) + address)
+
+    complete = 0
+    while complete < total_jobs:
+        try:
+            # a timeout keeps the main thread responsive to ctrl+c
+            job, t, timed_out, log, name = results.get(True, 1)
+        except Queue.Empty:
+            continue
+        complete += 1
+        if t is None:  # rejected; name is the reason
+            print "rejected: %s (%s)\n  %s" % (" ".join(job.command), name,
+                                               status(complete))
+            continue
+        on_job_finished(job, t, timed_out, log)
+        print "finished on %s: %s\n  %s" % (name, " ".join(job.command),
+                                            status(complete))
+
+    server.shutdown()
+    server.server_close()
+
+
+# parse a list of cpus such as "0-3,8" into [0, 1, 2, 3, 8]
+def parse_cpus(spec):
+    cpus = set()
+    for part in spec.split(","):
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return sorted(cpus)
+
+
+# pull jobs from a coordinator and run them on this machine, pinned to the
+# given cpus (all of them if None). workers sharing a machine should be given
+# disjoint cpus, or they pin their jobs to the same cores.
+def run_worker(address, threads, warm, monitor, cpus=None):
+    if cpus is None:
+        cpus = range(psutil.cpu_count())
+    threads = min(available_threads(threads), len(cpus))
+    compile_runner()
+    environment = environment_digest()
+
+    # jobs name the coordinator's copy of run.rkt; run ours instead
+    cwd = os.path.dirname(os.path.realpath(__file__))
+    run_path = os.path.join(cwd, "benchmarks/run.rkt")
+
+    sock = socket.create_connection(address)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    rfile = sock.makefile("rb")
+    wfile = sock.makefile("wb")
+    print "connected to coordinator %s:%d with %d threads" % (
+            address + (threads,))
+
+    runner = JobRunner(warm)
+    running_cpus = {}  # job id -> cpus
+    threads_free = threads
+    nodes = numa_nodes()
+    finished = False
+
+    if monitor:
+        Monitor(parse_address(monitor, "localhost"),
+                lambda: {"summary": "worker for %s:%d: %d jobs running" % (
+                                      address + (len(runner.running),)),
+                         "jobs": running_status(runner, running_cpus)})
+
+    try:
+        while True:
+            # ask for as much work as we have room for
+            while not finished and threads_free > 0:
+                send_message(wfile, {"type": "request", "threads": threads_free,
+                                     "capacity": threads,
+                                     "environment": environment})
+                msg = recv_message(rfile)
+                if msg["type"] == "error":
+                    raise EOFError(msg["reason"])
+                if msg["type"] != "job":
+                    finished = msg["type"] == "done"
+                    break
+                job = Job(**msg["job"])
+                job = job._replace(command=[job.command[0], run_path] +
+                                             job.command[2:])
+                my_cpus = pick_cpus(cpus, job.threads, nodes)
+                cpus = [c for c in cpus if c not in my_cpus]
+                running_cpus[job.id] = my_cpus
+                threads_free -= job.threads
+                log = runner.start(job, my_cpus)
+                print "starting: %s\n  --> %s" % (" ".join(job.command), log)
+
+            if finished and not runner.running:
+                break
+
+            # wake up periodically to ask again: a job may have been re-queued
+            for job, t, timed_out, log in runner.wait(WORKER_POLL_INTERVAL):
+                events = events_path(log)
+                send_message(wfile, {"type": "result", "id": job.id,
+                                     "time": t, "timed_out": timed_out,
+                                     "log": encode_log(log),
+                                     "events": encode_log(events)
+                                                 if os.path.exists(events)
+                                                 else None})
+                remove_log(log)
+                threads_free += job.threads
+                cpus = sorted(cpus + running_cpus.pop(job.id))
+                print "finished: %s" % " ".join(job.command)
+    except (EOFError, socket.error) as e:
+        # the coordinator closes connections once it has every result
+        if runner.running:
+            print "lost coordinator (%s); stopping %d running jobs" % (
+                    e, len(runner.running))
+    finally:
+        runner.kill_all()
+        sock.close()
+
+
+# job logs travel between workers and the coordinator compressed and base64
+# encoded, so that they fit in a JSON message
+def encode_log(path):
+    return base64.b64encode(compress_chunks(file_chunks(path)))
+
+
+# decode a log from a worker into the given file (or a temporary one), and
+# return its path
+def decode_log(data, path=None):
+    if path is None:
+        f = tempfile.NamedTemporaryFile(prefix="synapse-", suffix=".log",
+                                        delete=False)
+    else:
+        f = open(path, "wb")
+    with f:
+        for chunk in decompress_chunks(base64.b64decode(data)):
+            f.write(chunk)
+    return f.name
+
+
 ## main ########################################################################
 
 if __name__ == "__main__":
     p = argparse.ArgumentParser(description='Synapse experiment runner')
-    p.add_argument("file", help="experiment file to run")
+    p.add_argument("file", nargs="?", help="experiment file to run")
     p.add_argument("--dry-run", action="store_true", 
                      help="only list the jobs to execute")
     p.add_argument("-n", "--threads", type=int, default=1, 
@@ -404,14 +1713,73 @@ if __name__ == "__main__":
     p.add_argument("--output-dir", help="directory to output to")
     p.add_argument("-f", "--force", action="store_true",
                      help="ignore cached results")
+    p.add_argument("--budget", type=float, metavar="SECONDS",
+                     help="stop the sweep after this many seconds, skipping "
+                          "jobs that have not finished")
+    p.add_argument("-r", "--resume", action="store_true",
+                     help="continue an interrupted run of the experiment, "
+                          "appending to its output files; its jobs also save "
+                          "checkpoints, to resume from if this run is "
+                          "interrupted in turn")
     p.add_argument("-np", "--no-post-process", action="store_true",
                      help="do not run post-process file")
     p.add_argument("-s", "--sequential", action="store_true",
                      help="run one job at a time regardless of threads")
+    p.add_argument("-w", "--warm", action="store_true",
+                     help="reuse a pool of warm racket processes across jobs")
     p.add_argument("--only", help="only run specified benchmarks (useful for"
                                   "partitioning across nodes")
+    p.add_argument("--coordinator", metavar="[HOST:]PORT",
+                     help="serve jobs to worker agents instead of running them")
+    p.add_argument("--worker", metavar="HOST:PORT",
+                     help="run jobs for the coordinator at HOST:PORT, using "
+                          "-n threads")
+    p.add_argument("--cpus", metavar="LIST",
+                     help="with --worker, pin jobs only to these cpus (e.g. "
+                          "0-3,8), so that workers on one machine do not share "
+                          "cores")
+    p.add_argument("--monitor", metavar="[HOST:]PORT",
+                     help="serve the progress of running jobs over HTTP (for "
+                          "local runs and worker agents)")
+    p.add_argument("--cache-stats", action="store_true",
+                     help="print statistics about the result cache and exit")
+    p.add_argument("--cache-gc", action="store_true",
+                     help="remove stale cache entries and exit")
+    p.add_argument("--cache-max-age", type=float, metavar="DAYS",
+                     help="with --cache-gc, also remove entries unused for DAYS")
+    p.add_argument("--cache-max-size", type=float, metavar="MB",
+                     help="with --cache-gc, also evict least recently used "
+                          "entries until the cache holds at most MB of logs")
     args = p.parse_args()
 
+    if args.worker:
+        run_worker(parse_address(args.worker, "localhost"), args.threads,
+                   args.warm, args.monitor,
+                   parse_cpus(args.cpus) if args.cpus else None)
+        sys.exit(0)
+
+    output_dir = args.output_dir
+    if not output_dir:
+        output_dir = os.path.join(
+                       os.path.dirname(os.path.realpath(__file__)), 
+                       "experiments/data")
+    if not os.path.exists(output_dir):
+        os.mkdir(output_dir)
+
+    if args.cache_stats or args.cache_gc:
+        compile_runner()
+        cache = open_cache(output_dir)
+        if args.cache_gc:
+            max_age = args.cache_max_age
+            max_size = args.cache_max_size
+            cache.gc(max_age * 86400 if max_age is not None else None,
+                     max_size * 1e6 if max_size is not None else None)
+        cache.print_stats()
+        sys.exit(0)
+
+    if args.file is None:
+        p.error("an experiment file is required")
+
     with open(args.file) as f:
         experiment = json.load(f)
 
@@ -422,14 +1790,6 @@ if __name__ == "__main__":
     if not job_name:
         job_name = "experiment"
 
-    output_dir = args.output_dir
-    if not output_dir:
-        output_dir = os.path.join(
-                       os.path.dirname(os.path.realpath(__file__)), 
-                       "experiments/data")
-    if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
-
     plot = experiment.get("plot", None)
 
     execute_jobs(jobs, args.threads, job_name, output_dir, plot, args)
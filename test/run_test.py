@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# Tests for run.py's sweep policies; run with: python test/run_test.py
+import imp
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+run = imp.load_source("run", os.path.join(os.path.dirname(__file__), "..",
+                                          "run.py"))
+
+
+def job(policy):
+    return run.Job(id=0, command=[], threads=1, timeout=100, ident={},
+                   config="c", policy=policy)
+
+
+class StableCostTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.dir, "job.log")
+        self.progress = run.JobProgress(self.log)
+        self.policy = run.SweepPolicy()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, *events):
+        with open(run.events_path(self.log), "a") as f:
+            for evt in events:
+                f.write(json.dumps(evt) + "\n")
+
+    def start(self, sketch, remaining, unstarted):
+        return {"event": "sketch-start", "sketch": sketch, "place": 0,
+                "complete": 0, "remaining": remaining, "unstarted": unstarted,
+                "samples": 0}
+
+    def test_stops_once_nothing_is_left_to_start(self):
+        j = job({"stable_cost": 0})
+        # an unbounded metasketch has no count of sketches left to start
+        self.write(self.start("(1)", None, None),
+                   {"event": "best-cost", "cost": 3, "remaining": 2,
+                    "unstarted": 1})
+        self.assertFalse(self.policy.stop(j, self.progress))  # new best cost
+        self.assertFalse(self.policy.stop(j, self.progress))  # one to start
+        # the last sketch starts; it is still running, but none are left
+        self.write(self.start("(2)", 2, 0))
+        self.assertTrue(self.policy.stop(j, self.progress))
+
+    def test_waits_for_a_stable_cost(self):
+        j = job({"stable_cost": 3600})
+        self.write({"event": "best-cost", "cost": 3, "remaining": 1,
+                    "unstarted": 0})
+        self.assertFalse(self.policy.stop(j, self.progress))
+        self.assertFalse(self.policy.stop(j, self.progress))
+
+
+class ProfileTest(unittest.TestCase):
+    def row(self, place, snapshot, phase, time):
+        return {"event": "profile", "place": place, "phase": phase,
+                "sketch": None, "count": 1, "time": time,
+                "snapshot": snapshot}
+
+    def test_latest_snapshot_of_each_place(self):
+        snapshots = {}
+        for evt in [self.row(None, 1, "idle", 1.0),
+                    self.row(0, 1, "synthesize", 2.0),
+                    self.row(None, 2, "idle", 3.0),
+                    self.row(None, 2, "save", 0.5),
+                    self.row(0, 2, "synthesize", 4.0),
+                    self.row(0, 2, "verify", 1.0),
+                    # a row of an earlier snapshot, logged late
+                    self.row(0, 1, "synthesize", 2.0),
+                    {"event": "sketch-start"}]:
+            run.add_profile_event(snapshots, evt)
+        self.assertEqual(run.profile_totals(snapshots),
+                         {"idle": 3.0, "save": 0.5, "synthesize": 4.0,
+                          "verify": 1.0})
+
+
+if __name__ == "__main__":
+    unittest.main()